@@ -16,7 +16,7 @@ def main():
         long_description=longdesc,
         author="Anthony Scopatz",
         author_email="scopatz@gmail.com",
-        description="Access Warcraft 3 replay files from Python 2 or 3.",
+        description="Access Warcraft 3 replay files from Python 3.",
         license="CC0",
         data_files=[("", ['license', 'readme.rst']),],
         )
@@ -4,14 +4,14 @@
 
 :author: scopz <scopatz@gmail.com>
 """
-from __future__ import unicode_literals, print_function
 import io
+import gc
 import sys
-import base64
 import zlib
 import struct
 import binascii
 from collections import namedtuple
+from functools import lru_cache
 
 __version__ = '1.0.5'
 
@@ -32,89 +32,88 @@ BUILD_1_13 = 6037
 # build number associated with v1.14b of the game
 BUILD_1_14B = 6040
 
-if sys.version_info[0] < 3:
-    BLENFLAG = {1: 'B', WORD: 'H', DWORD: 'L', 8: 'Q'}
-    b2i = lambda b: struct.unpack('<' + BLENFLAG[len(b)], b)[0]
-
-    # to print unicode
-    import codecs
-    UTF8Writer = codecs.getwriter('utf8')
-    utf8writer = UTF8Writer(sys.stdout)
-    def umake(f):
-        def uprint(*objects, **kw):
-            uo = map(unicode, objects)
-            if 'file' not in kw:
-                kw['file'] = utf8writer
-            f(*uo, **kw)
-        return uprint
-    print = umake(print)
-
-    # fake lru_cache
-    lru_cache = lambda maxsize=128, typed=False: lambda f: f
-else:
-    b2i = lambda b: b if isinstance(b, int) else int.from_bytes(b, 'little')
-    from functools import lru_cache
-
-def nulltermstr(b):
-    """Returns the next null terminated string from bytes and its length."""
-    i = b.find(NULLSTR)
+b2i = lambda b: b if isinstance(b, int) else int.from_bytes(b, 'little')
+
+def nulltermstr(b, start=0):
+    """Returns the next null terminated string from bytes, beginning at the
+    start index, and its length. Only the string itself is copied out of b.
+    If there is no null terminator, the length is -1.
+    """
+    i = b.find(NULLSTR, start)
+    s = b[start:i]
+    # the utf-8 codec already decodes pure ASCII runs in bulk, so no separate
+    # ASCII check is needed. latin-1 catches anything that is not valid utf-8.
     try:
-        s = b[:i].decode('utf-8')
-    except:
-        s = b[:i].decode('latin-1')
-    return s, i
+        s = s.decode('utf-8')
+    except UnicodeDecodeError:
+        s = s.decode('latin-1')
+    return s, (-1 if i < 0 else i - start)
 
 def fixedlengthstr(b, i):
     """Returns a string of length i from bytes"""
     s = b[:i].decode('utf-8')
     return s
 
-def blizdecomp(b):
-    """Performs wacky blizard 'decompression' and returns bytes and len in
-    original string.
+# per mask byte, the amount to subtract from each of the 7 bytes that follow it
+_BLIZ_DEC = tuple(bytes([(~m >> j) & 1 for j in range(1, 8)]) for m in range(256))
+
+def blizdecomp(b, start=0):
+    """Performs wacky blizard 'decompression', beginning at the start index,
+    and returns bytes and len in original string.
     """
-    if isinstance(b, str):
-        b = list(map(b2i, b))
-    d = []
-    pos = 0
-    mask = None
-    while b[pos] != 0:
-        if pos%8 == 0:
-            mask = b[pos]
-        elif ((mask & (0x1 << (pos%8))) == 0):
-            d.append(b[pos] - 1)
-        else:
-            d.append(b[pos])
-        pos += 1
-    if bytes == str:
-        d = b''.join(map(chr, d))
-    else:
-        d = bytes(d)
-    return d, pos
+    enc = b[start:b.index(0, start)]
+    n = len(enc)
+    masks = enc[::8]
+    d = b''.join([enc[i+1:i+8] for i in range(0, n, 8)])
+    dec = b''.join([_BLIZ_DEC[m] for m in masks])[:len(d)]
+    # every encoded byte is non-zero, so subtracting the 0/1 decrements as one
+    # big integer never borrows across byte boundaries
+    d = (int.from_bytes(d, 'big') - int.from_bytes(dec, 'big')).to_bytes(len(d), 'big')
+    return d, n
 
 def blizdecode(b):
     d, l = blizdecomp(b)
     return d.decode(), l
 
+# bit tuples for every byte value, least significant bit first
+_BITS = tuple(tuple((b >> i) & 1 for i in range(8)) for b in range(256))
+
+# bit field lookup tables, keyed by the normalized slice indices
+_BITFIELDS = {}
+
 def bits(b):
     """Returns the bits in a byte"""
     if isinstance(b, str):
         b = ord(b)
-    return tuple([(b >> i) & 1 for i in range(8)])
+    return _BITS[b & 0xFF]
 
 def bitfield(b, idx):
     """Returns an integer representing the bit field. idx may be a slice."""
-    f = bits(b)[idx]
-    if f != 0 and f != 1:
-        val = 0
-        for i, x in enumerate(f):
-            val += x * 2**i
-        f = val
-    return f
+    if not isinstance(idx, slice):
+        return bits(b)[idx]
+    key = idx.indices(8)
+    table = _BITFIELDS.get(key, None)
+    if table is None:
+        table = tuple(sum(x << i for i, x in enumerate(f[idx])) for f in _BITS)
+        _BITFIELDS[key] = table
+    if isinstance(b, str):
+        b = ord(b)
+    return table[b & 0xFF]
 
 def b2f(b):
     return struct.unpack('<f', b)[0]
 
+# precompiled unpackers for fixed layout records, these read a whole record
+# in one call rather than one b2i() per field
+_U_LADDER = struct.Struct('<II').unpack_from
+_U_SLOT = struct.Struct('<BxBBBBB').unpack_from
+_U_LEAVE = struct.Struct('<xIBII').unpack_from
+_U_TIME_SLOT = struct.Struct('<xHH').unpack_from
+_U_COMMAND = struct.Struct('<BH').unpack_from
+_U_CHAT = struct.Struct('<xBHB').unpack_from
+_U_CHAT_MODE = struct.Struct('<I').unpack_from
+_U_COUNTDOWN = struct.Struct('<xII').unpack_from
+
 RACES = {
     0x01: 'human',
     0x02: 'orc',
@@ -1304,11 +1303,11 @@ class Player(namedtuple('Player', ['id', 'name', 'race', 'ishost',
         return self
 
     @classmethod
-    def from_raw(cls, data):
-        kw = {'ishost': b2i(data[0]) == 0,
-              'id': b2i(data[1])}
-        kw['name'], i = nulltermstr(data[2:])
-        n = 2 + i + 1
+    def from_raw(cls, data, start=0):
+        kw = {'ishost': b2i(data[start]) == 0,
+              'id': b2i(data[start+1])}
+        kw['name'], i = nulltermstr(data, start+2)
+        n = start + 2 + i + 1
         custom_or_ladder = b2i(data[n])
         n += 1
         if custom_or_ladder != 0x08:  # custom
@@ -1316,15 +1315,13 @@ class Player(namedtuple('Player', ['id', 'name', 'race', 'ishost',
             kw['runtime'] = 0
             kw['race'] = 'none'
         elif custom_or_ladder == 0x08:  # ladder
-            kw['runtime'] = b2i(data[n:n+4])
-            n += 4
-            race_flag = b2i(data[n:n+4])
-            n += 4
+            kw['runtime'], race_flag = _U_LADDER(data, n)
+            n += 8
             kw['race'] = RACES[race_flag]
         else:
             raise ValueError("Player not recognized custom or ladder.")
-        kw['size'] = n
-        kw['raw'] = data[:n]
+        kw['size'] = n - start
+        kw['raw'] = data[start:n]
         return cls(**kw)
 
 class ReforgedPlayerMetadata(namedtuple('ReforgedPlayerMetadata', 
@@ -1335,8 +1332,8 @@ class ReforgedPlayerMetadata(namedtuple('ReforgedPlayerMetadata',
         return self
         
     @classmethod
-    def from_raw(cls, data):
-        n = 0
+    def from_raw(cls, data, start=0):
+        n = start
         kw = {}
 
         kw['size'] = b2i(data[n])
@@ -1345,15 +1342,15 @@ class ReforgedPlayerMetadata(namedtuple('ReforgedPlayerMetadata',
         n += 2
         int_name_length = b2i(data[n])
         n += 1
-        kw['name'] = fixedlengthstr(data[n:], int_name_length)
+        kw['name'] = fixedlengthstr(data[n:n+int_name_length], int_name_length)
         n = n + int_name_length + 1
         int_clan_length = b2i(data[n])
         n += 1
-        kw['clan'] = fixedlengthstr(data[n:], int_clan_length)
+        kw['clan'] = fixedlengthstr(data[n:n+int_clan_length], int_clan_length)
         n = n + int_clan_length + 1
         int_extra_length = b2i(data[n])
         n += 1
-        kw['raw'] = data[:kw['size']]
+        kw['raw'] = data[start:start+kw['size']]
         return cls(**kw)
 
 class SlotRecord(namedtuple('Player', ['player_id', 'status', 'ishuman', 'team',
@@ -1369,12 +1366,13 @@ class SlotRecord(namedtuple('Player', ['player_id', 'status', 'ishuman', 'team',
 
     @classmethod
     def from_raw(cls, data):
-        kw = {'player_id': b2i(data[0]),
-              'status': STATUS[b2i(data[2])],
-              'ishuman': (b2i(data[3]) == 0x00),
-              'team': b2i(data[4]),
-              'color': COLORS[b2i(data[5])] if len(COLORS) > b2i(data[5]) else 'other',
-              'race': RACES.get(b2i(data[6] & 0x3F), 'none'),
+        player_id, status, ishuman, team, color, race = _U_SLOT(data)
+        kw = {'player_id': player_id,
+              'status': STATUS[status],
+              'ishuman': (ishuman == 0x00),
+              'team': team,
+              'color': COLORS[color] if len(COLORS) > color else 'other',
+              'race': RACES.get(race & 0x3F, 'none'),
               }
         kw['size'] = size = len(data)
         kw['raw'] = data
@@ -1384,30 +1382,71 @@ class SlotRecord(namedtuple('Player', ['player_id', 'status', 'ishuman', 'team',
             kw['handicap'] = b2i(data[8])
         return cls(**kw)
 
+    @classmethod
+    def from_raw_array(cls, data, recsize):
+        """Returns a list of slot records from contiguous raw records that are
+        each recsize bytes long. Each field is read for all records at once by
+        taking a strided slice of the data.
+        """
+        n = len(data) // recsize
+        ais = [AI_STRENGTH[x] for x in data[7::recsize]] if 8 <= recsize else ['normal'] * n
+        handicaps = data[8::recsize] if 9 <= recsize else [100] * n
+        raws = [data[i:i+recsize] for i in range(0, n*recsize, recsize)]
+        cols = zip(data[0::recsize], data[2::recsize], data[3::recsize],
+                   data[4::recsize], data[5::recsize], data[6::recsize],
+                   ais, handicaps, raws)
+        ncolors = len(COLORS)
+        return [cls(player_id=player_id, status=STATUS[status],
+                    ishuman=(ishuman == 0x00), team=team,
+                    color=COLORS[color] if ncolors > color else 'other',
+                    race=RACES.get(race & 0x3F, 'none'), ai=ai, handicap=handicap,
+                    raw=raw, size=recsize)
+                for player_id, status, ishuman, team, color, race, ai, handicap, raw
+                in cols]
+
+def _player_name(f, pid):
+    """Returns the name of a player in the w3g File f, or a placeholder made
+    from the player ID when there is no file to look it up in.
+    """
+    if f is None:
+        return 'player{0}'.format(pid)
+    return f.player_name(pid)
+
 class Event(object):
     """An event base class."""
 
+    __slots__ = ('time',)
+
     apm = False
 
     def __init__(self, f):
-        self.f = f
         self.time = f.clock
 
+    def __str__(self):
+        return self.format()
+
+    def format(self, f=None):
+        """Returns a description of the event. Player names are looked up in
+        the w3g File f, if it is given.
+        """
+        return "[{t}]".format(t=self.strtime())
+
     def strtime(self):
-        secs = self.time / 1000.0
-        s = secs % 60
-        m = int(secs / 60) % 60
-        h = int(secs / 3600)
+        s, ms = divmod(self.time, 1000)
+        m, s = divmod(s, 60)
+        h, m = divmod(m, 60)
         rtn = []
         if h > 0:
             rtn.append("{0:02}".format(h))
         if m > 0:
             rtn.append("{0:02}".format(m))
-        rtn.append("{0:06.3f}".format(s))
+        rtn.append("{0:02}.{1:03}".format(s, ms))
         return ":".join(rtn)
 
 class Chat(Event):
 
+    __slots__ = ('player_id', 'mode', 'msg')
+
     apm = False
 
     def __init__(self, f, player_id, mode, msg):
@@ -1416,21 +1455,23 @@ class Chat(Event):
         self.mode = mode
         self.msg = msg
 
-    def __str__(self):
+    def format(self, f=None):
         t = self.strtime()
-        p = self.f.player_name(self.player_id)
-        m = self.strmode()
+        p = _player_name(f, self.player_id)
+        m = self.strmode(f)
         return "[{t}] <{m}> {p}: {msg}".format(t=t, p=p, m=m, msg=self.msg)
 
-    def strmode(self):
+    def strmode(self, f=None):
         mode = self.mode
         if not mode.startswith('player'):
             return mode
         pid = int(mode[6:])
-        return self.f.player_name(pid)
+        return _player_name(f, pid)
 
 class LeftGame(Event):
 
+    __slots__ = ('player_id', 'closedby', 'resultflag', 'inc', 'unknownflag', 'next')
+
     apm = False
 
     remote_results = {
@@ -1467,9 +1508,9 @@ class LeftGame(Event):
         self.unknownflag = unknownflag
         self.next = None
 
-    def __str__(self):
+    def format(self, f=None):
         t = self.strtime()
-        p = self.f.player_name(self.player_id)
+        p = _player_name(f, self.player_id)
         r = self.result()
         rtn = "[{t}] <{cb}> {p} left game, {r}"
         return rtn.format(t=t, p=p, cb=self.closedby, r=r)
@@ -1493,6 +1534,8 @@ class LeftGame(Event):
 
 class Countdown(Event):
 
+    __slots__ = ('mode', 'secs')
+
     apm = False
 
     def __init__(self, f, mode, secs):
@@ -1500,13 +1543,40 @@ class Countdown(Event):
         self.mode = mode
         self.secs = secs
 
-    def __str__(self):
+    def format(self, f=None):
         t = self.strtime()
         rtn = "[{t}] Game countdown {mode}, {m:02}:{s:02} left"
         return rtn.format(t=t, mode=self.mode, m=int(self.secs/60), s=self.secs%60)
 
+ACTIONS = {}
+ACTIONS_LE_1_06 = {}
+ACTIONS_GT_1_06 = {}
+ACTIONS_LE_1_14B = {}
+ACTIONS_GT_1_14B = {}
+
+# (<= build, > build) lookup tables for actions whose ID changed in a patch
+_VERSIONED_ACTIONS = {
+    BUILD_1_06: (ACTIONS_LE_1_06, ACTIONS_GT_1_06),
+    BUILD_1_14B: (ACTIONS_LE_1_14B, ACTIONS_GT_1_14B),
+    }
+
+def register_action(cls):
+    """Class decorator that adds an action to the action ID lookup tables.
+    Actions whose id is an (old, new) tuple are registered in the tables for
+    the build given by their le attribute.
+    """
+    if isinstance(cls.id, tuple):
+        le, gt = _VERSIONED_ACTIONS[cls.le]
+        le[cls.id[0]] = cls
+        gt[cls.id[1]] = cls
+    else:
+        ACTIONS[cls.id] = cls
+    return cls
+
 class Action(Event):
 
+    __slots__ = ('player_id',)
+
     le = -1
     id = -1
     size = 1
@@ -1516,9 +1586,9 @@ class Action(Event):
         super(Action, self).__init__(f)
         self.player_id = player_id
 
-    def __str__(self):
+    def format(self, f=None):
         t = self.strtime()
-        p = self.f.player_name(self.player_id)
+        p = _player_name(f, self.player_id)
         rtn = "[{t}] <{c}> {p}"
         return rtn.format(t=t, c=self.__class__.__name__, p=p)
 
@@ -1527,6 +1597,7 @@ class Action(Event):
             return 'Ground'
         return 'Object#{0}'.format(b2i(o))
 
+@register_action
 class Pause(Action):
 
     id = 0x01
@@ -1535,6 +1606,7 @@ class Pause(Action):
     def __init__(self, f, player_id, action_block):
         super(Pause, self).__init__(f, player_id, action_block)
 
+@register_action
 class Resume(Action):
 
     id = 0x02
@@ -1543,6 +1615,7 @@ class Resume(Action):
     def __init__(self, f, player_id, action_block):
         super(Resume, self).__init__(f, player_id, action_block)
 
+@register_action
 class SetGameSpeed(Action):
 
     id = 0x03
@@ -1553,10 +1626,11 @@ class SetGameSpeed(Action):
         super(SetGameSpeed, self).__init__(f, player_id, action_block)
         self.speed = b2i(action_block[1])
 
-    def __str__(self):
-        s = super(SetGameSpeed, self).__str__()
+    def format(self, f=None):
+        s = super(SetGameSpeed, self).format(f)
         return '{0} - {1}'.format(s, SPEEDS[self.speed])
 
+@register_action
 class IncreaseGameSpeed(Action):
 
     id = 0x04
@@ -1565,6 +1639,7 @@ class IncreaseGameSpeed(Action):
     def __init__(self, f, player_id, action_block):
         super(IncreaseGameSpeed, self).__init__(f, player_id, action_block)
 
+@register_action
 class DecreaseGameSpeed(Action):
 
     id = 0x05
@@ -1573,6 +1648,7 @@ class DecreaseGameSpeed(Action):
     def __init__(self, f, player_id, action_block):
         super(DecreaseGameSpeed, self).__init__(f, player_id, action_block)
 
+@register_action
 class SaveGame(Action):
 
     id = 0x06
@@ -1581,13 +1657,14 @@ class SaveGame(Action):
 
     def __init__(self, f, player_id, action_block):
         super(SaveGame, self).__init__(f, player_id, action_block)
-        self.name, n = nulltermstr(action_block[1:])
+        self.name, n = nulltermstr(action_block, 1)
         self.size = 1 + n + 1
 
-    def __str__(self):
-        s = super(SaveGame, self).__str__()
+    def format(self, f=None):
+        s = super(SaveGame, self).format(f)
         return '{0} - {1}'.format(s, self.name)
 
+@register_action
 class SaveGameFinished(Action):
 
     id = 0x07
@@ -1597,6 +1674,7 @@ class SaveGameFinished(Action):
     def __init__(self, f, player_id, action_block):
         super(SaveGameFinished, self).__init__(f, player_id, action_block)
 
+@register_action
 class Ability(Action):
 
     id = 0x10
@@ -1615,12 +1693,13 @@ class Ability(Action):
         offset += 2 * DWORD if f.build_num >= BUILD_1_07 else 0
         self.size = offset
 
-    def __str__(self):
-        s = super(Ability, self).__str__()
+    def format(self, f=None):
+        s = super(Ability, self).format(f)
         aflgs = ABILITY_FLAGS.get(self.flags, None)
         astr = '' if aflgs is None else ' [{0}]'.format(aflgs)
         return '{0} - {1}{2}'.format(s, ITEMS.get(self.ability, self.ability), astr)
 
+@register_action
 class AbilityPosition(Ability):
 
     id = 0x11
@@ -1636,11 +1715,12 @@ class AbilityPosition(Ability):
         self.loc = (x, y)
         self.size = offset
 
-    def __str__(self):
-        s = super(AbilityPosition, self).__str__()
+    def format(self, f=None):
+        s = super(AbilityPosition, self).format(f)
         return '{0} at ({1:.3%}, {2:.3%})'.format(s, self.loc[0]/MAXPOS,
                                                      self.loc[1]/MAXPOS)
 
+@register_action
 class AbilityPositionObject(AbilityPosition):
 
     id = 0x12
@@ -1653,13 +1733,14 @@ class AbilityPositionObject(AbilityPosition):
         offset += 2*DWORD
         self.size = offset
 
-    def _super_str(self):
-        return super(AbilityPositionObject, self).__str__()
+    def _super_format(self, f=None):
+        return super(AbilityPositionObject, self).format(f)
 
-    def __str__(self):
-        s = super(AbilityPositionObject, self).__str__()
+    def format(self, f=None):
+        s = super(AbilityPositionObject, self).format(f)
         return '{0} {1}'.format(s, self.obj(self.object))
 
+@register_action
 class GiveItem(AbilityPositionObject):
 
     id = 0x13
@@ -1672,11 +1753,12 @@ class GiveItem(AbilityPositionObject):
         offset += 2*DWORD
         self.size = offset
 
-    def __str__(self):
-        s = super(GiveItem, self)._super_str()
+    def format(self, f=None):
+        s = super(GiveItem, self)._super_format(f)
         return '{0} {1} -> {2}'.format(s, self.obj(self.item),
                                           self.obj(self.object))
 
+@register_action
 class DoubleAbility(AbilityPosition):
 
     id = 0x14
@@ -1699,8 +1781,8 @@ class DoubleAbility(AbilityPosition):
         self.loc2 = (x2, y2)
         self.size = offset
 
-    def __str__(self):
-        s = super(DoubleAbility, self).__str__()
+    def format(self, f=None):
+        s = super(DoubleAbility, self).format(f)
         loc2str = ''
         if self.loc1 != self.loc2:
             loc2str = ' at ({0:.3%}, {1:.3%})'.format(self.loc2[0]/MAXPOS,
@@ -1708,6 +1790,7 @@ class DoubleAbility(AbilityPosition):
         return '{0} -> {1}{2}'.format(s, ITEMS.get(self.ability2, self.ability2),
                                       loc2str)
 
+@register_action
 class ChangeSelection(Action):
 
     id = 0x16
@@ -1722,14 +1805,14 @@ class ChangeSelection(Action):
         self.size = 4 + 8*n
         objs = action_block[4:]
         self.objects = [objs[i:i+8] for i in range(n)]
-        self.calc_apm()
+        self.calc_apm(f)
 
-    def calc_apm(self):
+    def calc_apm(self, f):
         if self.mode == 0x02:
             return
-        if len(self.f.events) == 0:
+        if len(f.events) == 0:
             return
-        last = self.f.events[-1]
+        last = f.events[-1]
         if last.player_id != self.player_id:
             return
         if not isinstance(last, ChangeSelection):
@@ -1738,11 +1821,12 @@ class ChangeSelection(Action):
             return
         self.apm = False
 
-    def __str__(self):
-        s = super(ChangeSelection, self).__str__()
+    def format(self, f=None):
+        s = super(ChangeSelection, self).format(f)
         return '{0} {1} [{2}]'.format(s, self.modes[self.mode],
                                       ', '.join(map(self.obj, self.objects)))
 
+@register_action
 class AssignGroupHotkey(Action):
 
     id = 0x17
@@ -1756,11 +1840,12 @@ class AssignGroupHotkey(Action):
         objs = action_block[4:]
         self.objects = [objs[i:i+8] for i in range(n)]
 
-    def __str__(self):
-        s = super(AssignGroupHotkey, self).__str__()
+    def format(self, f=None):
+        s = super(AssignGroupHotkey, self).format(f)
         return '{0} Assign Hotkey #{1} [{2}]'.format(s, self.hotkey,
             ', '.join(map(self.obj, self.objects)))
 
+@register_action
 class SelectGroupHotkey(Action):
 
     id = 0x18
@@ -1771,10 +1856,11 @@ class SelectGroupHotkey(Action):
         super(SelectGroupHotkey, self).__init__(f, player_id, action_block)
         self.hotkey = (b2i(action_block[1]) + 1) % 10
 
-    def __str__(self):
-        s = super(SelectGroupHotkey, self).__str__()
+    def format(self, f=None):
+        s = super(SelectGroupHotkey, self).format(f)
         return '{0} Select Hotkey #{1}'.format(s, self.hotkey)
 
+@register_action
 class SelectSubgroup(Action):
 
     id = 0x19
@@ -1789,6 +1875,7 @@ class SelectSubgroup(Action):
                 self.apm = True
         else:
             self.size = 13
+            self.subgroup = None
             offset = 1
             self.ability = ability = action_block[offset:offset+DWORD]
             offset += DWORD
@@ -1797,14 +1884,15 @@ class SelectSubgroup(Action):
             self.object = action_block[offset:offset+2*DWORD]
             offset += 2*DWORD
 
-    def __str__(self):
-        s = super(SelectSubgroup, self).__str__()
-        if self.f.build_num < BUILD_1_14B:
+    def format(self, f=None):
+        s = super(SelectSubgroup, self).format(f)
+        if self.subgroup is not None:
             return '{0} - #{1}'.format(s, self.subgroup)
         else:
             return '{0} - {1} {2}'.format(s,
                 ITEMS.get(self.ability, self.ability), self.obj(self.object))
 
+@register_action
 class PreSubselect(Action):
 
     id = 0x1A
@@ -1813,6 +1901,7 @@ class PreSubselect(Action):
     def __init__(self, f, player_id, action_block):
         super(PreSubselect, self).__init__(f, player_id, action_block)
 
+@register_action
 class UnknownAction(Action):
 
     #  <=1.14b, >1.14b
@@ -1824,6 +1913,7 @@ class UnknownAction(Action):
     def __init__(self, f, player_id, action_block):
         super(UnknownAction, self).__init__(f, player_id, action_block)
 
+@register_action
 class SelectGroundItem(Action):
 
     #  <=1.14b, >1.14b
@@ -1836,10 +1926,11 @@ class SelectGroundItem(Action):
         super(SelectGroundItem, self).__init__(f, player_id, action_block)
         self.item = action_block[2:10]
 
-    def __str__(self):
-        s = super(SelectGroundItem, self).__str__()
+    def format(self, f=None):
+        s = super(SelectGroundItem, self).format(f)
         return '{0} - {1} '.format(s, self.obj(self.item))
 
+@register_action
 class CancelHeroRevival(Action):
 
     #  <=1.14b, >1.14b
@@ -1852,10 +1943,11 @@ class CancelHeroRevival(Action):
         super(CancelHeroRevival, self).__init__(f, player_id, action_block)
         self.hero = action_block[1:9]
 
-    def __str__(self):
-        s = super(CancelHeroRevival, self).__str__()
+    def format(self, f=None):
+        s = super(CancelHeroRevival, self).format(f)
         return '{0} - {1} '.format(s, self.obj(self.hero))
 
+@register_action
 class RemoveUnitFromBuildingQueue(Action):
 
     #  <=1.14b, >1.14b
@@ -1871,11 +1963,12 @@ class RemoveUnitFromBuildingQueue(Action):
         if unit[-2:] != NUMERIC_ITEM:
             self.unit = unit[::-1]
 
-    def __str__(self):
-        s = super(RemoveUnitFromBuildingQueue, self).__str__()
+    def format(self, f=None):
+        s = super(RemoveUnitFromBuildingQueue, self).format(f)
         return '{0} - {1} at position #{2}'.format(s, ITEMS.get(self.unit, self.unit),
                                                    self.pos)
 
+@register_action
 class RareUnknownAction(Action):
 
     id = 0x21
@@ -1885,6 +1978,7 @@ class RareUnknownAction(Action):
     def __init__(self, f, player_id, action_block):
         super(RareUnknownAction, self).__init__(f, player_id, action_block)
 
+@register_action
 class TheDudeAbides(Action):
 
     id = 0x20
@@ -1894,6 +1988,7 @@ class TheDudeAbides(Action):
     def __init__(self, f, player_id, action_block):
         super(TheDudeAbides, self).__init__(f, player_id, action_block)
 
+@register_action
 class SomebodySetUpUsTheBomb(Action):
 
     id = 0x22
@@ -1903,6 +1998,7 @@ class SomebodySetUpUsTheBomb(Action):
     def __init__(self, f, player_id, action_block):
         super(SomebodySetUpUsTheBomb, self).__init__(f, player_id, action_block)
 
+@register_action
 class WarpTen(Action):
 
     id = 0x23
@@ -1912,6 +2008,7 @@ class WarpTen(Action):
     def __init__(self, f, player_id, action_block):
         super(WarpTen, self).__init__(f, player_id, action_block)
 
+@register_action
 class IocainePowder(Action):
 
     id = 0x24
@@ -1921,6 +2018,7 @@ class IocainePowder(Action):
     def __init__(self, f, player_id, action_block):
         super(IocainePowder, self).__init__(f, player_id, action_block)
 
+@register_action
 class PointBreak(Action):
 
     id = 0x25
@@ -1930,6 +2028,7 @@ class PointBreak(Action):
     def __init__(self, f, player_id, action_block):
         super(PointBreak, self).__init__(f, player_id, action_block)
 
+@register_action
 class WhosYourDaddy(Action):
 
     id = 0x26
@@ -1939,6 +2038,7 @@ class WhosYourDaddy(Action):
     def __init__(self, f, player_id, action_block):
         super(WhosYourDaddy, self).__init__(f, player_id, action_block)
 
+@register_action
 class KeyserSoze(Action):
 
     id = 0x27
@@ -1949,10 +2049,11 @@ class KeyserSoze(Action):
         super(KeyserSoze, self).__init__(f, player_id, action_block)
         self.gold = b2i(action_block[2:2+DWORD]) - 2**31
 
-    def __str__(self):
-        s = super(KeyserSoze, self).__str__()
+    def format(self, f=None):
+        s = super(KeyserSoze, self).format(f)
         return '{0} - {1} gold'.format(s, self.gold)
 
+@register_action
 class LeafitToMe(Action):
 
     id = 0x28
@@ -1963,10 +2064,11 @@ class LeafitToMe(Action):
         super(LeafitToMe, self).__init__(f, player_id, action_block)
         self.lumber = b2i(action_block[2:2+DWORD]) - 2**31
 
-    def __str__(self):
-        s = super(LeafitToMe, self).__str__()
+    def format(self, f=None):
+        s = super(LeafitToMe, self).format(f)
         return '{0} - {1} lumber'.format(s, self.lumber)
 
+@register_action
 class ThereIsNoSpoon(Action):
 
     id = 0x2
@@ -1976,6 +2078,7 @@ class ThereIsNoSpoon(Action):
     def __init__(self, f, player_id, action_block):
         super(ThereIsNoSpoon, self).__init__(f, player_id, action_block)
 
+@register_action
 class StrengthAndHonor(Action):
 
     id = 0x2A
@@ -1985,6 +2088,7 @@ class StrengthAndHonor(Action):
     def __init__(self, f, player_id, action_block):
         super(StrengthAndHonor, self).__init__(f, player_id, action_block)
 
+@register_action
 class ItVexesMe(Action):
 
     id = 0x2B
@@ -1994,6 +2098,7 @@ class ItVexesMe(Action):
     def __init__(self, f, player_id, action_block):
         super(ItVexesMe, self).__init__(f, player_id, action_block)
 
+@register_action
 class WhoIsJohnGalt(Action):
 
     id = 0x2C
@@ -2003,6 +2108,7 @@ class WhoIsJohnGalt(Action):
     def __init__(self, f, player_id, action_block):
         super(WhoIsJohnGalt, self).__init__(f, player_id, action_block)
 
+@register_action
 class GreedIsGood(Action):
 
     id = 0x2D
@@ -2013,10 +2119,11 @@ class GreedIsGood(Action):
         super(GreedIsGood, self).__init__(f, player_id, action_block)
         self.gold = self.lumber = b2i(action_block[2:2+DWORD]) - 2**31
 
-    def __str__(self):
-        s = super(GreedIsGood, self).__str__()
+    def format(self, f=None):
+        s = super(GreedIsGood, self).format(f)
         return '{0} - {1} gold and {2} lumber'.format(s, self.gold, self.lumber)
 
+@register_action
 class DayLightSavings(Action):
 
     id = 0x2E
@@ -2027,6 +2134,7 @@ class DayLightSavings(Action):
         super(DayLightSavings, self).__init__(f, player_id, action_block)
         self.time = struct.unpack('f', action_block[1:5])
 
+@register_action
 class ISeeDeadPeople(Action):
 
     id = 0x2F
@@ -2036,6 +2144,7 @@ class ISeeDeadPeople(Action):
     def __init__(self, f, player_id, action_block):
         super(ISeeDeadPeople, self).__init__(f, player_id, action_block)
 
+@register_action
 class Synergy(Action):
 
     id = 0x30
@@ -2045,6 +2154,7 @@ class Synergy(Action):
     def __init__(self, f, player_id, action_block):
         super(Synergy, self).__init__(f, player_id, action_block)
 
+@register_action
 class SharpAndShiny(Action):
 
     id = 0x31
@@ -2054,6 +2164,7 @@ class SharpAndShiny(Action):
     def __init__(self, f, player_id, action_block):
         super(SharpAndShiny, self).__init__(f, player_id, action_block)
 
+@register_action
 class AllYourBaseAreBelongToUs(Action):
 
     id = 0x32
@@ -2063,6 +2174,7 @@ class AllYourBaseAreBelongToUs(Action):
     def __init__(self, f, player_id, action_block):
         super(AllYourBaseAreBelongToUs, self).__init__(f, player_id, action_block)
 
+@register_action
 class ChangeAllyOptions(Action):
 
     id = 0x50
@@ -2073,6 +2185,8 @@ class ChangeAllyOptions(Action):
         super(ChangeAllyOptions, self).__init__(f, player_id, action_block)
         self.ally_id = b2i(action_block[1])
         self.flags_bits = bits(b2i(action_block[2:4])) + bits(b2i(action_block[5:9]))
+        svi = 10 if f.build_num >= BUILD_1_07 else 9
+        self.shares_victory = bool(self.flags_bits[svi])
 
     def flagstr(self):
         fs = []
@@ -2083,19 +2197,18 @@ class ChangeAllyOptions(Action):
             fs.append('shares vision')
         if b[6]:
             fs.append('shares unit control')
-        svi = 10 if self.f.build_num >= BUILD_1_07 else 9
-
-        if b[svi]:
+        if self.shares_victory:
             fs.append('shares victory')
         if len(fs) > 1:
             fs[-1] = 'and ' + fs[-1]
         return ', '.format(fs)
 
-    def __str__(self):
-        s = super(ChangeAllyOptions, self).__str__()
-        a = self.f.player_name(self.ally_id)
+    def format(self, f=None):
+        s = super(ChangeAllyOptions, self).format(f)
+        a = _player_name(f, self.ally_id)
         return '{0} {1} with {2}'.format(s, self.flagstr(), a)
 
+@register_action
 class TransferResources(Action):
 
     id = 0x51
@@ -2110,12 +2223,13 @@ class TransferResources(Action):
         offset += DWORD
         self.lumber = b2i(action_block[offset:offset+DWORD])
 
-    def __str__(self):
-        s = super(TransferResources, self).__str__()
-        a = self.f.player_name(self.ally_id)
+    def format(self, f=None):
+        s = super(TransferResources, self).format(f)
+        a = _player_name(f, self.ally_id)
         return '{0} transfered {1} gold and {2} lumber to {3}'.format(s, self.gold,
                                                                       self.lumber, a)
 
+@register_action
 class MapTriggerChatCommand(Action):
 
     id = 0x60
@@ -2124,9 +2238,11 @@ class MapTriggerChatCommand(Action):
     def __init__(self, f, player_id, action_block):
         super(MapTriggerChatCommand, self).__init__(f, player_id, action_block)
         offset = 1 + 2*DWORD
-        s, i = nulltermstr(action_block[offset:])
-        self.size = offset + i + 1
+        # only the length of the chat command is needed, skip decoding it
+        i = action_block.find(NULLSTR, offset)
+        self.size = len(action_block) if i < 0 else i + 1
 
+@register_action
 class EscapePressed(Action):
 
     id = 0x61
@@ -2136,6 +2252,7 @@ class EscapePressed(Action):
     def __init__(self, f, player_id, action_block):
         super(EscapePressed, self).__init__(f, player_id, action_block)
 
+@register_action
 class ScenarioTrigger(Action):
 
     id = 0x62
@@ -2143,8 +2260,9 @@ class ScenarioTrigger(Action):
 
     def __init__(self, f, player_id, action_block):
         super(ScenarioTrigger, self).__init__(f, player_id, action_block)
-        self.size = 13 if self.f.build_num >= BUILD_1_07 else 9
+        self.size = 13 if f.build_num >= BUILD_1_07 else 9
 
+@register_action
 class HeroSkillSubmenu(Action):
 
     le = BUILD_1_06
@@ -2155,6 +2273,7 @@ class HeroSkillSubmenu(Action):
     def __init__(self, f, player_id, action_block):
         super(HeroSkillSubmenu, self).__init__(f, player_id, action_block)
 
+@register_action
 class BuildingSubmenu(Action):
 
     le = BUILD_1_06
@@ -2165,6 +2284,7 @@ class BuildingSubmenu(Action):
     def __init__(self, f, player_id, action_block):
         super(BuildingSubmenu, self).__init__(f, player_id, action_block)
 
+@register_action
 class MinimapSignal(Action):
 
     le = BUILD_1_06
@@ -2181,11 +2301,12 @@ class MinimapSignal(Action):
         offset += DWORD
         self.loc = (x, y)
 
-    def __str__(self):
-        s = super(MinimapSignal, self).__str__()
+    def format(self, f=None):
+        s = super(MinimapSignal, self).format(f)
         return '{0} at ({1:.3%}, {2:.3%})'.format(s, self.loc[0]/MAXPOS,
                                                      self.loc[1]/MAXPOS)
 
+@register_action
 class ContinueGameB(Action):
 
     le = BUILD_1_06
@@ -2196,6 +2317,7 @@ class ContinueGameB(Action):
     def __init__(self, f, player_id, action_block):
         super(ContinueGameB, self).__init__(f, player_id, action_block)
 
+@register_action
 class ContinueGameA(Action):
 
     le = BUILD_1_06
@@ -2206,6 +2328,7 @@ class ContinueGameA(Action):
     def __init__(self, f, player_id, action_block):
         super(ContinueGameA, self).__init__(f, player_id, action_block)
 
+@register_action
 class UnknownScenario(Action):
 
     id = 0x75
@@ -2215,20 +2338,6 @@ class UnknownScenario(Action):
     def __init__(self, f, player_id, action_block):
         super(UnknownScenario, self).__init__(f, player_id, action_block)
 
-# has to come after the action classes
-_locs = locals()
-ACTIONS = {a.id: a for a in _locs.values() if hasattr(a, 'id') and \
-                                    isinstance(a.id, int) and a.id > 0}
-ACTIONS_LE_1_06 = {a.id[0]: a for a in _locs.values() if hasattr(a, 'id') and \
-                                    isinstance(a.id, tuple) and a.le == BUILD_1_06}
-ACTIONS_GT_1_06 = {a.id[1]: a for a in _locs.values() if hasattr(a, 'id') and \
-                                    isinstance(a.id, tuple) and a.le == BUILD_1_06}
-ACTIONS_LE_1_14B = {a.id[0]: a for a in _locs.values() if hasattr(a, 'id') and \
-                                    isinstance(a.id, tuple) and a.le == BUILD_1_14B}
-ACTIONS_GT_1_14B = {a.id[1]: a for a in _locs.values() if hasattr(a, 'id') and \
-                                    isinstance(a.id, tuple) and a.le == BUILD_1_14B}
-del _locs
-
 class File(object):
     """A class that represents w3g files.
 
@@ -2318,7 +2427,8 @@ class File(object):
     def _read_blocks(self):
         f = self.f
         self.loc = self.header_size
-        data = b''
+        # accumulate into a bytearray, appending to bytes is quadratic
+        data = bytearray()
         for n in range(self.nblocks):
             block_size = b2i(f.read(WORD))
             if self.is_reforged == True:
@@ -2338,41 +2448,55 @@ class File(object):
             if len(dat) != block_size_decomp:
                 raise zlib.error("Decompressed data size does not match expected size.")
             data += dat
-        self._parse_blocks(data)
+        self._parse_blocks(bytes(data))
 
     def _parse_blocks(self, data):
         self.events = []
         self.clock = 0
         self._lastleft = None
+        # action ID lookup table for this replay's build
+        self._actions = actions = dict(ACTIONS)
+        actions.update(ACTIONS_LE_1_06 if self.build_num <= BUILD_1_06 \
+                       else ACTIONS_GT_1_06)
+        actions.update(ACTIONS_LE_1_14B if self.build_num <= BUILD_1_14B \
+                       else ACTIONS_GT_1_14B)
         _parsers = {
             0x17: self._parse_leave_game,
-            0x1A: lambda data: 5,
-            0x1B: lambda data: 5,
-            0x1C: lambda data: 5,
+            0x1A: lambda data, pos: pos + 5,
+            0x1B: lambda data, pos: pos + 5,
+            0x1C: lambda data, pos: pos + 5,
             0x1E: self._parse_time_slot,  # old blockid
             0x1F: self._parse_time_slot,  # new blockid
             0x20: self._parse_chat,
-            0x22: lambda data: 6,
-            0x23: lambda data: 11,
+            0x22: lambda data, pos: pos + 6,
+            0x23: lambda data, pos: pos + 11,
             0x2F: self._parse_countdown,
             }
-        offset = self._parse_startup(data)
-        data = data[offset:]
-        blockid = b2i(data[0])
-        while blockid != 0:
-            offset = _parsers[blockid](data)
-            data = data[offset:]
-            blockid = b2i(data[0])
+        # each parser takes the position of its block in data and returns
+        # the position of the next block, so data is never re-sliced
+        pos = self._parse_startup(data)
+        # every event allocated here stays alive in self.events, so letting the
+        # cyclic garbage collector rescan the growing list only costs time
+        gcenabled = gc.isenabled()
+        gc.disable()
+        try:
+            blockid = b2i(data[pos])
+            while blockid != 0:
+                pos = _parsers[blockid](data, pos)
+                blockid = b2i(data[pos])
+        finally:
+            if gcenabled:
+                gc.enable()
 
     def _parse_startup(self, data):
         offset = 4  # first four bytes have unknown meaning
-        self.players = [Player.from_raw(data[offset:])]
+        self.players = [Player.from_raw(data, offset)]
         offset += self.players[0].size
-        self.game_name, i = nulltermstr(data[offset:])
+        self.game_name, i = nulltermstr(data, offset)
         offset += i + 1
         offset += 1  # extra null byte after game name
         # perform wacky decompression
-        decomp, i = blizdecomp(data[offset:])
+        decomp, i = blizdecomp(data, offset)
         offset += i + 1
         # get game settings
         settings = decomp[:13]
@@ -2391,8 +2515,8 @@ class File(object):
         self.random_races = bool(ctl[2])
         self.observer_referees = bool(ctl[6])
         self.map_checksum = str(binascii.hexlify(settings[9:]), 'utf-8')
-        self.map_name, i = nulltermstr(decomp[13:])
-        self.creator_name, _ = nulltermstr(decomp[13+i+1:])
+        self.map_name, i = nulltermstr(decomp, 13)
+        self.creator_name, _ = nulltermstr(decomp, 13+i+1)
         # back to less dense data
         self.player_count = b2i(data[offset:offset+4])
         offset += 4
@@ -2406,7 +2530,7 @@ class File(object):
         self.language_id = data[offset:offset+4]
         offset += 4
         while b2i(data[offset]) == 0x16:
-            self.players.append(Player.from_raw(data[offset:]))
+            self.players.append(Player.from_raw(data, offset))
             offset += self.players[-1].size
             offset += 4  # 4 unknown padding bytes after each player record
         if b2i(data[offset]) != 0x19:
@@ -2416,7 +2540,7 @@ class File(object):
             self.reforged_player_metadata = []
             while (b2i(data[offset]) != 0x19) & (int_attempts < 24):
                 offset += 1
-                self.reforged_player_metadata.append(ReforgedPlayerMetadata.from_raw(data[offset:]))
+                self.reforged_player_metadata.append(ReforgedPlayerMetadata.from_raw(data, offset))
                 offset += self.reforged_player_metadata[-1].size + 1
                 int_attempts += 1
         assert b2i(data[offset]) == 0x19
@@ -2429,26 +2553,22 @@ class File(object):
         assert 7 <= recsize <= 9
         rawrecs = data[offset:offset+(recsize*nrecs)]
         offset += recsize*nrecs
-        self.slot_records = [SlotRecord.from_raw(rawrecs[n*recsize:(n+1)*recsize]) \
-                             for n in range(nrecs)]
+        self.slot_records = SlotRecord.from_raw_array(rawrecs, recsize)
         self.random_seed = data[offset:offset+DWORD]
         offset += DWORD
         self.select_mode = SELECT_MODES.get(b2i(data[offset]), 'unknown')
         offset += 1
         self.num_start_positions = b2i(data[offset])
         offset += 1
+        # lookup tables for player IDs, the first record for an ID wins
+        self._slot_records_by_id = {sr.player_id: sr for sr in reversed(self.slot_records)}
+        self._players_by_id = {p.id: p for p in reversed(self.players)}
+        self._player_names = {pid: 'observer' for pid in self._slot_records_by_id}
+        self._player_names.update({pid: p.name for pid, p in self._players_by_id.items()})
         return offset
 
-    def _parse_leave_game(self, data):
-        offset = 1
-        reason = b2i(data[offset:offset+DWORD])
-        offset += DWORD
-        player_id = b2i(data[offset])
-        offset += 1
-        res = b2i(data[offset:offset+DWORD])
-        offset += DWORD
-        unknownflag = b2i(data[offset:offset+DWORD])
-        offset += DWORD
+    def _parse_leave_game(self, data, pos):
+        reason, player_id, res, unknownflag = _U_LEAVE(data, pos)
         # compute inc
         if self._lastleft is None:
             inc = False
@@ -2468,58 +2588,44 @@ class File(object):
         if self._lastleft is not None:
             self._lastleft.next = e
         self._lastleft = e
-        return 14
-
-    def _parse_time_slot(self, data):
-        n = b2i(data[1:1+WORD])
-        offset = 1 + WORD
-        dt = b2i(data[offset:offset+WORD])
-        offset += WORD
-        cmddata = data[offset:n+3]
-        while len(cmddata) > 0:
-            player_id = b2i(cmddata[0])
-            i = b2i(cmddata[1:1+WORD])
-            action_block = cmddata[1+WORD:i+1+WORD]
-            self._parse_actions(player_id, action_block)
-            cmddata = cmddata[i+1+WORD:]
+        return pos + 14
+
+    def _parse_time_slot(self, data, pos):
+        n, dt = _U_TIME_SLOT(data, pos)
+        end = pos + n + 3
+        pos += 1 + 2*WORD
+        while pos < end:
+            player_id, i = _U_COMMAND(data, pos)
+            pos += 1 + WORD
+            self._parse_actions(player_id, data[pos:pos+i])
+            pos += i
         self.clock += dt
-        return n + 3
+        return end
 
-    def _parse_chat(self, data):
-        player_id = b2i(data[1])
-        n = b2i(data[2:2+WORD])
-        offset = 2 + WORD
-        flags = b2i(data[offset])
-        offset += 1
+    def _parse_chat(self, data, pos):
+        player_id, n, flags = _U_CHAT(data, pos)
+        offset = pos + 2 + WORD + 1
         if flags == 0x10:
             mode = 'startup'
         else:
-            m = b2i(data[offset:offset+DWORD])
+            m, = _U_CHAT_MODE(data, offset)
             offset += DWORD
             mode = CHAT_MODES.get(m, None)
             if mode is None:
                 mode = 'player{0}'.format(m - 0x3)
-        msg, _ = nulltermstr(data[offset:])
+        msg, _ = nulltermstr(data, offset)
         self.events.append(Chat(self, player_id, mode, msg))
-        return n + 4
+        return pos + n + 4
 
-    def _parse_countdown(self, data):
-        offset = 1
-        m = b2i(data[offset:offset+DWORD])
-        offset += DWORD
+    def _parse_countdown(self, data, pos):
+        m, secs = _U_COUNTDOWN(data, pos)
         mode = 'running' if m == 0x00 else 'over'
-        secs = b2i(data[offset:offset+DWORD])
-        offset += DWORD
         e = Countdown(self, mode, secs)
         self.events.append(e)
-        return 9
+        return pos + 9
 
     def _parse_actions(self, player_id, action_block):
-        actions = dict(ACTIONS)
-        actions.update(ACTIONS_LE_1_06 if self.build_num <= BUILD_1_06 \
-                       else ACTIONS_GT_1_06)
-        actions.update(ACTIONS_LE_1_14B if self.build_num <= BUILD_1_14B \
-                       else ACTIONS_GT_1_14B)
+        actions = self._actions
         while len(action_block) > 0:
             aid = b2i(action_block[0])
             action = actions.get(aid, None)
@@ -2527,41 +2633,23 @@ class File(object):
                 return
             e = action(self, player_id, action_block)
             self.events.append(e)
-            action_block = action_block[e.size:]
+            # always move forward, a malformed action must not stall the loop
+            action_block = action_block[max(e.size, 1):]
 
-    @lru_cache(13)
     def slot_record(self, pid):
-        records = self.slot_records
-        for sr in records:
-            if sr.player_id == pid:
-                break
-        else:
+        sr = self._slot_records_by_id.get(pid, None)
+        if sr is None:
             raise ValueError("could not find slot record for player ID {0}".format(pid))
         return sr
 
-    @lru_cache(13)
     def player(self, pid):
-        players = self.players
-        if pid < len(players):
-            p = players[pid]
-            if p.id == pid:
-                return p
-        for p in players:
-            if p.id == pid:
-                break
-        else:
+        p = self._players_by_id.get(pid, None)
+        if p is None:
             p = self.slot_record(pid)
         return p
 
-    @lru_cache(13)
     def player_name(self, pid):
-        try:
-            p = self.player(pid)
-        except ValueError:
-            return "unknown"
-        if isinstance(p, SlotRecord):
-            return 'observer'
-        return p.name
+        return self._player_names.get(pid, "unknown")
 
     @lru_cache(13)
     def player_race(self, pid):
@@ -2636,6 +2724,10 @@ class File(object):
                                                   if len(a) > 2}
         return acts
 
+    def format_event(self, e):
+        """Returns a description of the event e, naming the players in it."""
+        return e.format(self)
+
     def winner(self):
         for e in self.events[-1:-300:-1]:
             if not isinstance(e, LeftGame):
@@ -2683,8 +2775,12 @@ class File(object):
 
 def main():
     f = File(sys.argv[1])
-    for event in f.events:
-        print(event)
+    # write the events out in chunks, rather than a line at a time, since
+    # terminals flush stdout on every newline
+    events = f.events
+    for i in range(0, len(events), 1024):
+        lines = [f.format_event(e) + '\n' for e in events[i:i+1024]]
+        sys.stdout.write(''.join(lines))
     f.print_apm()
     print('-' * 10)
     print('The winner is {0}'.format(f.player_name(f.winner())))